@@ -0,0 +1,225 @@
+'''Replay traffic recorded with `python -m bespokehttp --capture-file` against a local server.
+
+Each captured connection is opened again and sent the same data, split into the same fragments,
+at the same offsets from the start of the capture divided by --speed. A connection doesn't send
+data that followed a response in the capture until it has received that response, so requests on
+one connection never overlap however fast the replay runs. Reports request throughput and
+latency, the time from sending the last fragment of a request to receiving all of its response,
+and compares them against a baseline saved by an earlier run with --save.
+'''
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import selectors
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bespokehttp.capture import read_capture, OPENED, RECEIVED, RESPONDED, CLOSED
+
+
+class Connection(object):
+    '''The events captured on one connection, and the state of replaying them.'''
+
+    def __init__(self):
+        # (time, kind, data, completes_request)
+        self.events = []
+        self.next_event = 0
+        self.sock = None
+        # whether the connection has been opened but the server hasn't accepted it yet
+        self.connecting = False
+        self.received = b''
+        # the times at which requests still awaiting a response were sent
+        self.pending = deque()
+        self.done = False
+
+    @property
+    def next_event_time(self):
+        return self.events[self.next_event][0] if self.next_event < len(self.events) else None
+
+
+def load_connections(path):
+    '''Return the connections in the capture file, in the order they were opened.'''
+    connections = {}
+    with open(path, 'rb') as f:
+        for kind, connection_id, timestamp, data in read_capture(f):
+            connection = connections.setdefault(connection_id, Connection())
+            if kind == RESPONDED:
+                # the data received before a response is what the request was made of
+                for index in range(len(connection.events) - 1, -1, -1):
+                    if connection.events[index][1] == RECEIVED:
+                        connection.events[index] = connection.events[index][:3] + (True, )
+                        break
+            elif kind in (OPENED, RECEIVED, CLOSED):
+                connection.events.append((timestamp, kind, data, False))
+
+    return list(connections.values())
+
+
+def response_length(data):
+    '''Return the length of the complete response at the start of data, or None if it's
+    incomplete.'''
+    header_end = data.find(b'\r\n\r\n')
+    if header_end < 0:
+        return None
+
+    content_length = 0
+    for line in data[:header_end].split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            content_length = int(value)
+
+    length = header_end + 4 + content_length
+    return length if len(data) >= length else None
+
+
+def replay(connections, address, speed):
+    '''Replay the connections against the server at address, and return the latency in seconds of
+    each request, the number of requests that got no response, and the duration of the run.'''
+    selector = selectors.DefaultSelector()
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+
+    def finish(connection):
+        nonlocal errors
+        errors += len(connection.pending)
+        connection.pending.clear()
+        connection.done = True
+        if connection.sock is not None:
+            selector.unregister(connection.sock)
+            connection.sock.close()
+
+    active = list(connections)
+    while active:
+        now = time.perf_counter() - start
+
+        # send everything that is due, unless it has to wait for a response
+        for connection in active:
+            while not connection.done and connection.next_event_time is not None and \
+                    connection.next_event_time / speed <= now:
+                _, kind, data, completes_request = connection.events[connection.next_event]
+
+                if kind == OPENED:
+                    # connect without blocking, so a slow accept doesn't hold up other connections
+                    connection.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    connection.sock.setblocking(False)
+                    connection.sock.connect_ex(address)
+                    connection.connecting = True
+                    selector.register(connection.sock, selectors.EVENT_WRITE, connection)
+                elif connection.pending or connection.connecting:
+                    break
+                elif kind == RECEIVED:
+                    connection.sock.sendall(data)
+                    if completes_request:
+                        connection.pending.append(time.perf_counter())
+                elif kind == CLOSED:
+                    finish(connection)
+
+                connection.next_event += 1
+
+            if connection.next_event_time is None and not connection.pending and \
+                    not connection.connecting and not connection.done:
+                finish(connection)
+
+        active = [connection for connection in active if not connection.done]
+        if not active:
+            break
+
+        due = [connection.next_event_time / speed for connection in active
+               if connection.next_event_time is not None and not connection.pending
+               and not connection.connecting]
+        timeout = max(0, min(due) - (time.perf_counter() - start)) if due else None
+
+        for key, _ in selector.select(timeout):
+            connection = key.data
+
+            if connection.connecting:
+                if connection.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR):
+                    # none of the requests the connection would have sent get a response
+                    errors += sum(1 for event in connection.events[connection.next_event:]
+                                  if event[3])
+                    finish(connection)
+                    continue
+                connection.connecting = False
+                connection.sock.setblocking(True)
+                selector.modify(connection.sock, selectors.EVENT_READ, connection)
+                continue
+
+            data = connection.sock.recv(65536)
+            if not data:
+                finish(connection)
+                continue
+
+            connection.received += data
+            length = response_length(connection.received)
+            while length is not None:
+                received_at = time.perf_counter()
+                connection.received = connection.received[length:]
+                if connection.pending:
+                    latencies.append(received_at - connection.pending.popleft())
+                length = response_length(connection.received)
+
+    return latencies, errors, time.perf_counter() - start
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def summarize(latencies, errors, duration):
+    latencies = sorted(latency * 1000 for latency in latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'duration_s': duration,
+        'throughput_rps': len(latencies) / duration if duration else 0.0,
+        'latency_p50_ms': percentile(latencies, 0.5),
+        'latency_p90_ms': percentile(latencies, 0.9),
+        'latency_p99_ms': percentile(latencies, 0.99),
+        'latency_max_ms': latencies[-1] if latencies else 0.0,
+    }
+
+
+def report(results, baseline=None):
+    for name, value in results.items():
+        line = '{0:>16}: {1:12.3f}'.format(name, value)
+        if baseline and baseline.get(name):
+            line += '  ({0:+.1f}% vs baseline {1:.3f})'.format(
+                (value - baseline[name]) / baseline[name] * 100, baseline[name])
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('capture_file', help='a file recorded with --capture-file')
+    parser.add_argument('--host', default='localhost', help='(default: %(default)s)')
+    parser.add_argument('--port', type=int, default=9191, help='(default: %(default)s)')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='how many times faster than captured to replay (default: %(default)s)')
+    parser.add_argument('--save', help='write the results to this JSON file, for use as a baseline')
+    parser.add_argument('--baseline', help='compare against results saved by an earlier --save')
+    args = parser.parse_args()
+
+    connections = load_connections(args.capture_file)
+    results = summarize(*replay(connections, (args.host, args.port), args.speed))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    report(results, baseline)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+'''Measure the time from starting `python -m bespokehttp` to receiving its first response.
+
+Each run starts a new server process in a scratch directory, polls its port until it accepts a
+connection and answers a GET for a small file, then stops it.
+'''
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def request_until_answered(port, timeout):
+    '''Send a GET to the server until it responds, and return the status line.'''
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with socket.create_connection(('localhost', port)) as sock:
+                sock.sendall(b'GET /hello.txt HTTP/1.0\r\n\r\n')
+                response = b''
+                while b'\r\n' not in response:
+                    data = sock.recv(1024)
+                    if not data:
+                        break
+                    response += data
+                if response:
+                    return response.partition(b'\r\n')[0]
+        except ConnectionRefusedError:
+            time.sleep(0.001)
+    raise RuntimeError('Server did not respond within {} seconds'.format(timeout))
+
+
+def time_to_first_response(directory, timeout):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])))
+
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'bespokehttp', '--port', str(port)],
+        cwd=directory, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        status_line = request_until_answered(port, timeout)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    if not status_line.startswith(b'HTTP/1.0 200'):
+        raise RuntimeError('Unexpected response: {}'.format(status_line))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=20, help='number of server starts to time')
+    parser.add_argument('--timeout', type=float, default=10.0,
+                        help='seconds to wait for each server to respond')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'hello.txt'), 'w') as f:
+            f.write('hello\n')
+
+        times = [time_to_first_response(directory, args.timeout) for _ in range(args.runs)]
+
+    times_ms = [t * 1000 for t in times]
+    print('time to first response over {} runs: min {:.1f} ms, median {:.1f} ms, max {:.1f} ms'.format(
+        args.runs, min(times_ms), statistics.median(times_ms), max(times_ms)))
+
+
+if __name__ == '__main__':
+    main()
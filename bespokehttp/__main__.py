@@ -0,0 +1,4 @@
+from bespokehttp.server import main
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import os
+import itertools
+import threading
+import urllib.parse
+from collections import OrderedDict
+
+
+class DirectoryIndex(object):
+    '''Renders paginated HTML index pages for directories.
+
+    Entries are listed in the order os.scandir yields them, so a page is generated by reading only
+    as far into the directory as that page ends. Entries are marked as directories by the type the
+    directory entry carries, and symlinks aren't followed, so entries are only stat'ed on
+    filesystems that don't report entry types. Each page is rendered whole rather than streamed, so
+    that it can be cached; page_size bounds its size. Rendered pages are cached until the
+    directory's modification time changes, i.e. until an entry is added, removed or renamed.
+    '''
+
+    def __init__(self, page_size=1000, max_cached_pages=256):
+        self.page_size = page_size
+        self.max_cached_pages = max_cached_pages
+        # (path, url_path, page) -> (mtime_ns, chunks), least recently used first
+        self._pages = OrderedDict()
+        # the server's worker threads share one index
+        self._lock = threading.Lock()
+
+    def render(self, path, url_path, page=1):
+        '''Return the given page of the index for the directory at path as a tuple of byte chunks.
+
+        Args:
+            path (str): the absolute path of the directory
+            url_path (str): the URL path the directory was requested by, used to build links
+            page (int): the 1-based page number
+
+        Raises OSError if the directory can't be read, and IndexError if the page is past the end
+        of the listing.
+        '''
+        if page < 1:
+            raise IndexError('Page numbers start at 1')
+
+        key = (path, url_path, page)
+        mtime_ns = os.stat(path).st_mtime_ns
+
+        with self._lock:
+            cached = self._pages.get(key)
+            if cached and cached[0] == mtime_ns:
+                self._pages.move_to_end(key)
+                return cached[1]
+
+        chunks = self.render_page(path, url_path, page)
+
+        with self._lock:
+            self._pages[key] = (mtime_ns, chunks)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_cached_pages:
+                self._pages.popitem(last=False)
+
+        return chunks
+
+    def render_page(self, path, url_path, page):
+        '''Render one page of the directory index without consulting the cache.'''
+        import html
+
+        base = '/' + url_path.strip('/') + '/' if url_path.strip('/') else '/'
+        start = (page - 1) * self.page_size
+
+        with os.scandir(path) as entries:
+            # read one entry past the page to learn whether there is a next page
+            page_entries = list(itertools.islice(entries, start, start + self.page_size + 1))
+
+        has_next = len(page_entries) > self.page_size
+        page_entries = page_entries[:self.page_size]
+        if page > 1 and not page_entries:
+            raise IndexError('Page {} is past the end of the directory listing'.format(page))
+
+        title = html.escape('Index of {}'.format(base))
+        head = ('<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"><title>{0}</title></head>\n'
+                '<body>\n<h1>{0}</h1>\n<ul>\n').format(title)
+        if base != '/':
+            head += '<li><a href="{}">../</a></li>\n'.format(
+                urllib.parse.quote(base.rstrip('/').rpartition('/')[0] + '/'))
+
+        rows = []
+        for entry in page_entries:
+            name = entry.name + '/' if entry.is_dir(follow_symlinks=False) else entry.name
+            rows.append('<li><a href="{0}">{1}</a></li>\n'.format(
+                urllib.parse.quote(base + name, errors='surrogateescape'), html.escape(name)))
+
+        links = []
+        if page > 1:
+            links.append('<a href="{0}?page={1}">previous</a>'.format(urllib.parse.quote(base), page - 1))
+        if has_next:
+            links.append('<a href="{0}?page={1}">next</a>'.format(urllib.parse.quote(base), page + 1))
+        foot = '</ul>\n<p>{}</p>\n</body>\n</html>\n'.format(' '.join(links))
+
+        return (
+            head.encode(),
+            ''.join(rows).encode('utf-8', 'surrogateescape'),
+            foot.encode(),
+        )
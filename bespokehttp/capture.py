@@ -0,0 +1,82 @@
+'''Recording the traffic a server receives, so that it can be replayed later.
+
+A capture file starts with the MAGIC line, followed by records of what happened on each
+connection. Each record is a RECORD header, giving the kind of event, the connection it happened
+on, the seconds since the capture started and the length of the data that follows, then the data.
+Received data is recorded exactly as each read from the socket returned it, so a replay can
+reproduce how requests were fragmented as well as when they arrived.
+'''
+import time
+import struct
+import itertools
+
+
+MAGIC = b'BESPOKEHTTP-CAPTURE 1\n'
+
+# kind, connection id, seconds since the capture started, data length
+RECORD = struct.Struct('<BIdI')
+
+OPENED = 1
+RECEIVED = 2
+RESPONDED = 3
+CLOSED = 4
+
+
+class InvalidCaptureError(Exception):
+    pass
+
+
+class TrafficCapture(object):
+    '''Writes a record of each connection event to a binary file opened for writing.'''
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.output_file.write(MAGIC)
+        self.start = time.perf_counter()
+        self._connection_ids = itertools.count()
+
+    def write(self, kind, connection_id, data=b''):
+        self.output_file.write(RECORD.pack(
+            kind, connection_id, time.perf_counter() - self.start, len(data)))
+        if data:
+            self.output_file.write(data)
+
+    def opened(self):
+        '''Record a new connection, and return the id to record its events under.'''
+        connection_id = next(self._connection_ids)
+        self.write(OPENED, connection_id)
+        return connection_id
+
+    def received(self, connection_id, data):
+        self.write(RECEIVED, connection_id, data)
+
+    def responded(self, connection_id):
+        '''Record that the data received so far on the connection made up a complete request.'''
+        self.write(RESPONDED, connection_id)
+
+    def closed(self, connection_id):
+        self.write(CLOSED, connection_id)
+        self.output_file.flush()
+
+
+def read_capture(input_file):
+    '''Yield (kind, connection_id, time, data) tuples for each record in a capture file opened for
+    binary reading.
+
+    Raises InvalidCaptureError if the file is not a capture file.
+    '''
+    if input_file.read(len(MAGIC)) != MAGIC:
+        raise InvalidCaptureError('Not a bespokehttp capture file')
+
+    while True:
+        header = input_file.read(RECORD.size)
+        if len(header) < RECORD.size:
+            # a capture cut short while a record was being written ends at the last whole record
+            return
+
+        kind, connection_id, timestamp, length = RECORD.unpack(header)
+        data = input_file.read(length) if length else b''
+        if len(data) < length:
+            return
+
+        yield kind, connection_id, timestamp, data
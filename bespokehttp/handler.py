@@ -1,19 +1,14 @@
 import os
 import time
-import mimetypes
-import urllib
+import urllib.parse
 import errno
-import io
-import pwd
-import inspect
-import tempfile
 
 import logging
-logging.basicConfig(level=logging.INFO)
 LOG = logging.getLogger(__name__)
 
 from bespokehttp.httprequest import HttpRequest, IncompleteRequestError, InvalidRequestError
 from bespokehttp.httpresponse import HttpResponse
+from bespokehttp.autoindex import DirectoryIndex
 from bespokehttp import __version__
 
 
@@ -27,19 +22,37 @@ class NonexistentResourceError(Exception):
 class HttpRequestHandler(object):
     '''Parse a request, then construct and write a response.'''
 
-    def __init__(self, data):
-        self.data = io.BytesIO(data)
+    directory_index = DirectoryIndex()
+
+    # a profiling.RequestTrace to mark the stages of handling the request on, when tracing
+    trace = None
+
+    def __init__(self, data, request=None):
+        self.data = data
+        # the HttpRequest parsed from data, if the caller has already parsed it
+        self.request = request
 
     def handle(self):
         '''Read the request and write the response.'''
 
-        LOG.info('Reading request: {}'.format(self.data.getvalue()))
+        response = self.respond()
+        if response is None:
+            return b''
+        return response.render()
+
+    def respond(self):
+        '''Read the request and return an HttpResponse, or None if the request is incomplete.'''
+
+        LOG.info('Reading request: %r', self.data)
 
         try:
-            self.request = HttpRequest(self.data.getvalue())
+            if self.request is None:
+                self.request = HttpRequest(self.data)
+                if self.trace is not None:
+                    self.trace.mark('parsed')
         except IncompleteRequestError:
             # keep collecting data from the connection
-            return b'' 
+            return None
         except InvalidRequestError:
             # send a response that says what it got is invalid, no matter what comes next
             # e.g. a CR or LF before the end of the first line
@@ -48,18 +61,25 @@ class HttpRequestHandler(object):
             handler_method_name = 'respond_to_' + self.request.http_verb
             handler_method = getattr(self, handler_method_name, None)
             if handler_method:
+                if self.trace is not None:
+                    self.trace.mark('dispatched')
                 response = handler_method()
             else:
                 response = HttpResponse(405)
 
         response.headers['Date'] = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime())
-        LOG.info('Sending response: {}'.format(response.lines[0]))
-        return response.render()
+        LOG.info('Sending response: %s', response.status_line)
+        return response
 
     def respond_to_GET(self):
         '''Returns an HttpResponse to a GET request.'''
 
-        resource_path, _, _ = self.get_resource_path(self.request.path)
+        resource_path, query, _ = self.get_resource_path(self.request.path)
+
+        if os.path.isdir(resource_path):
+            if not self.is_served_path(resource_path):
+                return HttpResponse(403, None)
+            return self.respond_to_directory_GET(resource_path, query)
 
         try:
             type, encoding, content = self.read_resource(resource_path)
@@ -71,6 +91,25 @@ class HttpRequestHandler(object):
 
         return response
 
+    def respond_to_directory_GET(self, path, query):
+        '''Returns an HttpResponse listing one page of the entries in the directory at path.'''
+
+        try:
+            page = int(urllib.parse.parse_qs(query).get('page', ['1'])[0])
+        except ValueError:
+            return HttpResponse(400, None)
+
+        url_path = urllib.parse.unquote(self.request.path.partition('#')[0].partition('?')[0])
+
+        try:
+            content = self.directory_index.render(path, url_path, page)
+        except PermissionError:
+            return HttpResponse(403, None)
+        except (FileNotFoundError, IndexError):
+            return HttpResponse(404, None)
+
+        return HttpResponse(200, content, {'Content-Type': 'text/html; charset=utf-8'})
+
     def respond_to_HEAD(self):
         '''Returns an HttpResponse to a HEAD request.'''
         response = self.respond_to_get()
@@ -85,7 +124,7 @@ class HttpRequestHandler(object):
         but this user doesn't have permission, raise a PermissionDeniedError.'''
 
         if os.path.isdir(path):
-            return NonexistentResourceError()
+            raise NonexistentResourceError()
 
         contents = None
 
@@ -100,9 +139,22 @@ class HttpRequestHandler(object):
             else:
                 raise e
 
+        import mimetypes
         type, encoding = mimetypes.guess_type(path)
         return type, encoding, contents
 
+    @classmethod
+    def is_cgi_request(cls, path):
+        '''Returns whether a request for the URL path is answered by running a CGI script.'''
+        return False
+
+    @staticmethod
+    def is_served_path(path):
+        '''Returns whether the absolute path is within the directory being served, which is the
+        working directory.'''
+        root = os.getcwd()
+        return os.path.commonpath([root, path]) == root
+
     @staticmethod
     def get_resource_path(path):
         '''Returns a 3-tuple of the absolute path, query string, and URL fragment of the resource
@@ -127,8 +179,14 @@ class CgiRequestHandler(HttpRequestHandler):
 
     cgi_directory = os.path.abspath('cgi-bin')
 
-    def is_cgi_script(self, path):
-        return os.path.abspath(path).startswith(self.cgi_directory)
+    @classmethod
+    def is_cgi_script(cls, path):
+        return os.path.abspath(path).startswith(cls.cgi_directory)
+
+    @classmethod
+    def is_cgi_request(cls, path):
+        relpath = path[1:] if path[0] == '/' else path
+        return cls.is_cgi_script(relpath)
 
     def parse_cgi_script_path(self, path):
         '''Given an absolute request path, return the following CGI path components as a tuple:
@@ -175,13 +233,13 @@ class CgiRequestHandler(HttpRequestHandler):
     def respond_to_GET(self):
         '''Returns an HttpResponse to a GET request.'''
 
-        relpath = self.request.path[1:] if self.request.path[0] == '/' else self.request.path
-        if self.is_cgi_script(relpath):
+        if self.is_cgi_request(self.request.path):
             return self.respond_to_cgi_GET()
 
         return self.respond_to_noncgi_GET()
 
     def run_cgi_script(self, script_path, path_info=None, query=None, data=None):
+        import tempfile
 
         infile = tempfile.TemporaryFile(buffering=0)
         outfile = tempfile.TemporaryFile()
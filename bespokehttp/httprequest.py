@@ -1,4 +1,4 @@
-import io
+from collections.abc import Mapping
 
 class InvalidRequestError(Exception):
     '''Raised when the request is syntactically invalid no matter what data we receive next.'''
@@ -12,91 +12,189 @@ class IncompleteRequestError(Exception):
 class MissingContentLengthError(Exception):
     pass
 
+
+class HttpHeaders(Mapping):
+    '''A read-only, case-insensitive view of the header fields in a received request buffer.
+
+    Fields are kept as (name_start, name_end, value_start, value_end) offsets into the buffer and
+    are only copied out of it when accessed. Names and values are returned as bytes, with names in
+    the case they were received.
+    '''
+
+    __slots__ = ('_buffer', '_fields')
+
+    def __init__(self, buffer, fields=()):
+        self._buffer = memoryview(buffer)
+        self._fields = fields
+
+    def _find(self, name):
+        if isinstance(name, str):
+            name = name.encode('latin-1')
+        name = name.lower()
+        for name_start, name_end, value_start, value_end in self._fields:
+            # compare lengths first so that most mismatches don't need a copy of the field name
+            if name_end - name_start == len(name) and \
+                    self._buffer[name_start:name_end].tobytes().lower() == name:
+                return value_start, value_end
+        raise KeyError(name)
+
+    def __getitem__(self, name):
+        value_start, value_end = self._find(name)
+        return self._buffer[value_start:value_end].tobytes()
+
+    def __contains__(self, name):
+        try:
+            self._find(name)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        for name_start, name_end, _, _ in self._fields:
+            yield self._buffer[name_start:name_end].tobytes()
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(self.__class__.__name__, dict(self.items()))
+
+    @classmethod
+    def parse_field(cls, buffer, start, end):
+        '''Return the offsets of the name and stripped value of the header line in buffer[start:end].
+
+        Raises InvalidRequestError if the line has no colon.
+        '''
+        colon = buffer.find(b':', start, end)
+        if colon < 0:
+            raise InvalidRequestError('Expected a colon between request header name and value')
+
+        value_start, value_end = colon + 1, end
+        while value_start < value_end and buffer[value_start] in cls.whitespace:
+            value_start += 1
+        while value_end > value_start and buffer[value_end - 1] in cls.whitespace:
+            value_end -= 1
+
+        return start, colon, value_start, value_end
+
+    whitespace = frozenset(b' \t\r\n\x0b\x0c')
+
+
 class HttpRequest(object):
 
+    __slots__ = (
+        'data', 'http_verb', 'path', 'version', 'headers', 'content_length',
+        '_buffer', '_request_line_end', '_body_start',
+    )
+
     http_version = '1.0'
 
     def __init__(self, request_data):
         self.data = request_data
         self.parse_request()
 
-    def parse_request(self): 
-        self.request_line, self.header_lines, self.body = self.extract_request_components(self.data)
+    @property
+    def request_line(self):
+        return self._buffer[:self._request_line_end].tobytes()
+
+    @property
+    def header_lines(self):
+        return self._buffer[self._request_line_end:self._body_start - 2].tobytes().splitlines(True)
+
+    @property
+    def body(self):
+        '''The message body, as a memoryview into the received data.'''
+        return self._buffer[self._body_start:]
+
+    def parse_request(self):
+        self._buffer = memoryview(self.data)
+        self._request_line_end, fields, self._body_start = self.scan_request(self.data)
 
         self.http_verb, self.path, self.version = self.parse_request_line(self.request_line)
-        self.headers = self.parse_header_lines(self.header_lines)
+        self.headers = HttpHeaders(self._buffer, fields)
 
         self.content_length = 0
         try:
-            self.content_length = int(self.headers[b'Content-Length'])
+            content_length = self.headers[b'Content-Length']
         except KeyError:
             if self.http_verb in ('POST', ):
                 raise MissingContentLengthError()
+        else:
+            if not content_length.isdigit():
+                raise InvalidRequestError('Invalid Content-Length {!r}'.format(content_length))
+            self.content_length = int(content_length)
 
-        if len(self.body) < self.content_length:
+        body_length = len(self.data) - self._body_start
+        if body_length < self.content_length:
             raise IncompleteRequestError('Found {0} bytes in body but expected {1}'.format(
-                len(self.body), self.content_length))
+                body_length, self.content_length))
 
-        elif len(self.body) > self.content_length:
+        elif body_length > self.content_length:
             raise InvalidRequestError('Found {0} bytes in body but expected {1}'.format(
-                len(self.body), self.content_length))
+                body_length, self.content_length))
 
     @classmethod
-    def extract_request_components(cls, request_bytes):
-        '''Extract and return HTTP request message components from the given binary data.
+    def scan_request(cls, request_bytes):
+        '''Locate HTTP request message components in the given binary data without copying them.
 
         Args:
             request_bytes (bytes): the HTTP request message
 
         Returns:
-            (request_line, header_lines, body)
+            (request_line_end, header_fields, body_start), where header_fields is a list of
+            header field offsets as returned by HttpHeaders.parse_field
         '''
-        binary_stream = io.BytesIO(request_bytes)
-        request_line = binary_stream.readline()
-        cls.validate_line_termination(request_line)
-
-        header_lines = []
-        line = binary_stream.readline()
-        while line not in (b'\r\n', b''):
-            cls.validate_line_termination(line)
-            # continue extracting lines until we each an empty (delimiter-only) line
-            header_lines.append(line)
-            line = binary_stream.readline()
+        request_line_end = cls.find_line_end(request_bytes, 0)
 
-        if line == b'':
-            raise IncompleteRequestError('Expected a blank line after request headers')
+        header_line_offsets = []
+        line_start = request_line_end
+        line_end = cls.find_line_end(request_bytes, line_start)
+        while line_end - line_start != 2:
+            # continue scanning lines until we reach an empty (delimiter-only) line
+            header_line_offsets.append((line_start, line_end - 2))
+            line_start = line_end
+            line_end = cls.find_line_end(request_bytes, line_start)
 
-        body = binary_stream.read()
+        header_fields = cls.parse_header_fields(request_bytes, header_line_offsets)
+        return request_line_end, header_fields, line_end
 
-        return request_line, header_lines, body
-
-    @staticmethod 
+    @staticmethod
     def parse_request_line(line):
         tokens = line.rstrip().split(b' ')
         if len(tokens) == 3:
             http_verb, path, version = tokens
         else:
             raise InvalidRequestError("Invalid request line does not contain exactly 3 tokens")
-        
+
         return http_verb.decode(), path.decode(), version.decode()
 
     @staticmethod
-    def parse_header_lines(lines):
-        headers = {}
-
-        for line in lines:
+    def parse_header_fields(buffer, line_offsets):
+        '''Return the header field offsets, as returned by HttpHeaders.parse_field, of the header
+        lines at each (start, end) pair of offsets into buffer.'''
+        return [HttpHeaders.parse_field(buffer, start, end) for start, end in line_offsets]
 
-            try:
-                field_name, field_contents = line.split(b':', 1)
-            except ValueError:
-                raise InvalidRequestError('Expected a colon between request header name and value')
+    @classmethod
+    def parse_header_lines(cls, lines):
+        '''Return the HttpHeaders of a list of header lines without their line delimiters.'''
+        buffer = b'\r\n'.join(lines)
 
-            field_contents = field_contents.strip()
-            headers[field_name] = field_contents
+        line_offsets = []
+        start = 0
+        for line in lines:
+            line_offsets.append((start, start + len(line)))
+            start += len(line) + 2
 
-        return headers
+        return HttpHeaders(buffer, cls.parse_header_fields(buffer, line_offsets))
 
     @staticmethod
-    def validate_line_termination(line, line_delimiter=b'\r\n'):
-        if not line.endswith(line_delimiter):
+    def find_line_end(data, start, line_delimiter=b'\r\n'):
+        '''Return the offset just past the line delimiter of the line starting at data[start].
+
+        Raises IncompleteRequestError if the line does not end with the line delimiter.
+        '''
+        end = data.find(b'\n', start) + 1
+        if end - start < len(line_delimiter) or \
+                data[end - len(line_delimiter):end] != line_delimiter:
             raise IncompleteRequestError("Incomplete line does not end with line delimiter")
+        return end
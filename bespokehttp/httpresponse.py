@@ -1,21 +1,20 @@
-import sys
-import io
-import inspect
-
 class HttpResponse(object):
 
+    __slots__ = ('status_code', 'content', 'headers')
+
     def __init__(self, status_code, content=None, headers=None):
         """Create an HTTP response that can be rendered to the client.
 
         Args:
             status_code (integer): the HTTP status code of the response
-            content (bytes, optional): the message body; defaults to an empty string
+            content (bytes, optional): the message body, or a sequence of bytes chunks that make
+                it up; defaults to an empty string
             headers (dictionary, optional): header values, keyed by HTTP response header names;
                 defaults to the default_headers property
         """
         self.status_code = status_code
         self.content = content or ''
-        self.headers = self.default_headers.copy()
+        self.headers = self.default_headers
         if headers:
             self.headers.update(headers)
 
@@ -23,9 +22,15 @@ class HttpResponse(object):
     def status_description(self):
         return self.statuses.get(self.status_code, '')
 
+    @property
+    def content_length(self):
+        if isinstance(self.content, (list, tuple)):
+            return sum(len(chunk) for chunk in self.content)
+        return len(self.content)
+
     @property
     def default_headers(self):
-        content_length = len(self.content)
+        content_length = self.content_length
         default_headers = {
             'Connection': 'close',
             'Server': __name__.split('.')[0]
@@ -36,35 +41,33 @@ class HttpResponse(object):
         return default_headers
 
     @property
-    def lines(self):
-        _lines = []
+    def status_line(self):
+        return 'HTTP/1.0 {0} {1}'.format(self.status_code, self.status_description)
 
-        status_line = ['HTTP/1.0', str(self.status_code), self.status_description]
-        _lines.append(' '.join(status_line))
+    def render_header(self):
+        '''Return the encoded status line and header fields, including the blank delimiter line.'''
 
-        for header in self.headers.items():
-            _lines.append(': '.join(header))
+        header_lines = [self.status_line]
+        header_lines.extend('{0}: {1}'.format(name, value) for name, value in self.headers.items())
+        header_lines.append('\r\n')
+        return '\r\n'.join(header_lines).encode()
 
-        _lines.append('')
+    def buffers(self):
+        '''Return the full HTTP response message as a list of buffers to be written in order.
 
-        if self.content:
-            _lines.append(self.content)
-
-        return _lines
+        The message body is not copied; it is included as memoryviews of the content.
+        '''
+        header = self.render_header()
+        if not self.content:
+            return [header]
+        if isinstance(self.content, (list, tuple)):
+            return [header] + [memoryview(chunk) for chunk in self.content]
+        return [header, memoryview(self.content)]
 
     def render(self):
         '''Return the full HTTP response message.'''
 
-        message = io.BytesIO()
-
-        header_lines = self.lines[:-1] if self.content else self.lines
-        header = '\r\n'.join(header_lines) + '\r\n'
-        message.write(header.encode())
-
-        if self.content:
-            message.write(self.lines[-1])
-
-        return message.getvalue()
+        return b''.join(self.buffers())
 
 
     statuses = {
@@ -72,4 +75,7 @@ class HttpResponse(object):
         400: 'Bad Request',
         403: 'Forbidden',
         404: 'Not Found',
+        411: 'Length Required',
+        500: 'Internal Server Error',
+        503: 'Service Unavailable',
     }
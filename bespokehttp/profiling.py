@@ -0,0 +1,133 @@
+'''Profiling hooks for a running server.
+
+Neither hook does any work until it is turned on: the sampling profiler only runs once started,
+e.g. by a signal, and requests are only traced when the server is given a RequestTracer.
+'''
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+
+class SamplingProfiler(object):
+    '''Samples the stacks of one thread, or of every thread, at a fixed interval for a fixed
+    duration, and writes the sampled stacks in the collapsed format read by flamegraph.pl and
+    speedscope.'''
+
+    def __init__(self, output_dir='.', duration=10.0, interval=0.005):
+        self.output_dir = output_dir
+        self.duration = duration
+        self.interval = interval
+        self._sampler = None
+
+    @property
+    def running(self):
+        return self._sampler is not None and self._sampler.is_alive()
+
+    def start(self, thread_id=None):
+        '''Start sampling the thread with the given id, by default every thread, in a background
+        thread. Returns False without doing anything if sampling is already running.'''
+        if self.running:
+            return False
+
+        self._sampler = threading.Thread(target=self.run, args=(thread_id, ), daemon=True)
+        self._sampler.start()
+        return True
+
+    def handle_signal(self, signum=None, frame=None):
+        '''Start sampling every thread, i.e. the server loop and the workers handling requests.'''
+        self.start()
+
+    def run(self, thread_id=None):
+        '''Sample the stack of the thread with the given id, or of every other thread if it is None,
+        until the duration has passed, then write the samples.'''
+        counts = Counter()
+        sampler_id = threading.get_ident()
+
+        end = time.monotonic() + self.duration
+        while time.monotonic() < end:
+            frames = sys._current_frames()
+            if thread_id is not None:
+                if thread_id not in frames:
+                    break
+                frames = {thread_id: frames[thread_id]}
+
+            for sampled_id, frame in frames.items():
+                if sampled_id != sampler_id:
+                    counts[self.collapse_stack(frame)] += 1
+            del frames, frame
+            time.sleep(self.interval)
+
+        return self.write(counts)
+
+    @staticmethod
+    def collapse_stack(frame):
+        '''Return the stack ending at frame as semicolon-separated function labels, outermost
+        first.'''
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            labels.append('{0} ({1}:{2})'.format(code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        return ';'.join(reversed(labels))
+
+    def write(self, counts):
+        '''Write collapsed stacks and their sample counts to a new file, and return its path.'''
+        path = os.path.join(self.output_dir, 'bespokehttp-{0}-{1}.folded'.format(
+            os.getpid(), time.strftime('%Y%m%d%H%M%S')))
+
+        with open(path, 'w') as f:
+            for stack, count in counts.most_common():
+                f.write('{0} {1}\n'.format(stack, count))
+
+        return path
+
+
+class RequestTrace(object):
+    '''The times at which one request reached each stage of processing.'''
+
+    __slots__ = ('accepted', 'marks')
+
+    def __init__(self, accepted):
+        self.accepted = accepted
+        self.marks = []
+
+    def mark(self, event):
+        self.marks.append((event, time.perf_counter()))
+
+
+class RequestTracer(object):
+    '''Writes one JSON line per traced request to a file, giving the milliseconds from accepting
+    the connection to each stage of processing the request:
+
+        first_byte: the first data of the request was received
+        parsed: the request was parsed by HttpRequest
+        queued: the request was complete, and queued to be handled
+        dispatched: the respond_to_* method for the request was called
+        rendered: the response was rendered to buffers
+        sent: the last byte of the response was written to the socket
+    '''
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+
+    @staticmethod
+    def begin(accepted=None):
+        '''Return a trace for a request on a connection accepted at the given perf_counter time,
+        by default now.'''
+        return RequestTrace(time.perf_counter() if accepted is None else accepted)
+
+    def finish(self, trace, request=None, response=None):
+        import json
+
+        record = {
+            'time': time.time(),
+            'path': getattr(request, 'path', None),
+            'status': getattr(response, 'status_code', None),
+        }
+        for event, timestamp in trace.marks:
+            record[event] = round((timestamp - trace.accepted) * 1000, 3)
+
+        self.output_file.write(json.dumps(record) + '\n')
+        self.output_file.flush()
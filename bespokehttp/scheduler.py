@@ -0,0 +1,131 @@
+'''Deciding which queued request the server handles next.
+
+Complete requests are sorted into classes, e.g. by the size of the file requested or by path
+prefix. Each class has a weight, a limit on how many of its requests may be in progress at once,
+and a limit on how many may wait in its queue. Classes share the server by weighted fair queuing:
+each class has a virtual time that advances by 1/weight whenever one of its requests is started,
+and the class with the earliest virtual time goes next, so over time a class with weight 4 starts
+4 requests for every 1 started by a class with weight 1.
+'''
+from collections import deque
+
+
+class RequestClass(object):
+
+    __slots__ = ('name', 'weight', 'max_active', 'max_queued', 'queue', 'active', 'virtual_time')
+
+    def __init__(self, name, weight=1, max_active=8, max_queued=256):
+        '''Create a class of requests.
+
+        Args:
+            name (str): identifies the class
+            weight (number): the class's share of the server relative to the other classes
+            max_active (int): how many requests of the class may be in progress at once
+            max_queued (int): how many requests of the class may wait to be started
+        '''
+        self.name = name
+        self.weight = weight
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.queue = deque()
+        self.active = 0
+        self.virtual_time = 0.0
+
+    @property
+    def ready(self):
+        return bool(self.queue) and self.active < self.max_active
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(self.__class__.__name__, self.name)
+
+
+def default_classes():
+    return [
+        RequestClass('small', weight=8, max_active=64, max_queued=1024),
+        RequestClass('large', weight=2, max_active=8, max_queued=256),
+        RequestClass('cgi', weight=1, max_active=2, max_queued=64),
+    ]
+
+
+class Scheduler(object):
+
+    def __init__(self, classes=None, path_prefixes=(),
+                 large_size=256 * 1024, retry_after=1):
+        '''Create a scheduler.
+
+        Args:
+            classes (list of RequestClass, optional): defaults to the classes made by
+                default_classes(), which are 'small' and 'large' static files and 'cgi' scripts
+            path_prefixes (sequence of (prefix, class name) pairs): requests that aren't for CGI
+                scripts and whose path starts with a prefix belong to its class; the first
+                matching prefix wins
+            large_size (int): requests for resources bigger than this many bytes belong to the
+                'large' class, and all other requests to the 'small' class
+            retry_after (int): the seconds clients are asked to wait when a class's queue is full
+        '''
+        self.classes = dict((c.name, c) for c in (classes or default_classes()))
+        self.path_prefixes = tuple(path_prefixes)
+        self.large_size = large_size
+        self.retry_after = retry_after
+
+    def classify(self, path, size=None, cgi=False):
+        '''Return the RequestClass for a request for the given URL path, where size is the size of
+        the requested resource in bytes, if known, and cgi is whether the request runs a CGI script.
+
+        Requests for CGI scripts belong to the 'cgi' class. The path should already be normalised,
+        e.g. without dot segments, or a request could escape the class of its prefix.
+        '''
+        if cgi:
+            return self.classes['cgi']
+
+        path = '/' + path.lstrip('/')
+        for prefix, name in self.path_prefixes:
+            if path.startswith(prefix):
+                return self.classes[name]
+
+        if size is not None and size > self.large_size:
+            return self.classes['large']
+        return self.classes['small']
+
+    def enqueue(self, request_class, item):
+        '''Queue an item to be started when its class's turn comes. Returns False, without queuing
+        it, if the class's queue is full.'''
+        if len(request_class.queue) >= request_class.max_queued:
+            return False
+
+        if not request_class.queue and not request_class.active:
+            # a class that was idle doesn't get to make up for the turns it didn't need
+            request_class.virtual_time = max(request_class.virtual_time, self.virtual_time)
+
+        request_class.queue.append(item)
+        return True
+
+    @property
+    def virtual_time(self):
+        '''The earliest virtual time of the classes that have work queued or in progress.'''
+        times = [c.virtual_time for c in self.classes.values() if c.queue or c.active]
+        return min(times) if times else 0.0
+
+    @property
+    def ready(self):
+        '''Whether next() would return an item.'''
+        return any(c.ready for c in self.classes.values())
+
+    def next(self):
+        '''Start the next item to be handled, and return (request_class, item), or None if no class
+        with queued items is below its limit of active requests.
+
+        The caller must call finish() with the class once the item's response has been sent.
+        '''
+        ready = [c for c in self.classes.values() if c.ready]
+        if not ready:
+            return None
+
+        request_class = min(ready, key=lambda c: c.virtual_time)
+        request_class.virtual_time += 1.0 / request_class.weight
+        request_class.active += 1
+        return request_class, request_class.queue.popleft()
+
+    def finish(self, request_class):
+        '''Record that a request started by next() is no longer in progress.'''
+        request_class.active -= 1
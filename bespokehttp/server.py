@@ -1,68 +1,499 @@
 '''A bespoke HTTP server.
 
-Usage:
-  server.py [--port=<num>]
-
-Options:
-  -h --help     Show this screen
-  --port=<num>  The port number to listen on [default: 9191]
-
+Run it with `python -m bespokehttp`; pass --help for its options. When serving HTTPS, send SIGHUP
+to reload the certificate and key files, e.g. after they are renewed. Send SIGUSR1 to sample the
+server's stack for a while and write the samples out for a flame graph.
 '''
 import io
+import os
 import socket
 import select
+import threading
+from collections import deque
+
+import logging
+LOG = logging.getLogger(__name__)
+
+from bespokehttp.handler import CgiRequestHandler
+from bespokehttp.httprequest import (
+    HttpRequest, IncompleteRequestError, InvalidRequestError, MissingContentLengthError)
+from bespokehttp.httpresponse import HttpResponse
+from bespokehttp.scheduler import Scheduler
+
+
+# the most buffers a single sendmsg call may be given (IOV_MAX on Linux and BSDs)
+MAX_SENDMSG_BUFFERS = 1024
+
+# how many bytes of a response are written to a connection before other connections get a turn
+SEND_SLICE_SIZE = 64 * 1024
+
+
+def receive(sock):
+    '''Return the data available on the connection, b'' if the peer closed it, or None if no data
+    is ready yet.'''
+    try:
+        return sock.recv(1024)
+    except (BlockingIOError, InterruptedError):
+        return None
+
+
+def send_some(sock, buffers, limit):
+    '''Write up to limit bytes from the start of the buffers, using one scatter-gather sendmsg call
+    where the platform supports it, and return the buffers that are left to write.
 
-from docopt import docopt
-from handler import CgiRequestHandler
+    If the socket is non-blocking and can't take any data, nothing is written.
+    '''
+    chunk = []
+    size = 0
+    for buffer in buffers[:MAX_SENDMSG_BUFFERS]:
+        chunk.append(memoryview(buffer).cast('B')[:limit - size])
+        size += len(chunk[-1])
+        if size >= limit:
+            break
+
+    try:
+        sent = sock.sendmsg(chunk) if hasattr(sock, 'sendmsg') else sock.send(chunk[0])
+    except (BlockingIOError, InterruptedError):
+        return buffers
+
+    first = 0
+    while first < len(buffers) and sent >= len(buffers[first]):
+        sent -= len(buffers[first])
+        first += 1
+
+    buffers = buffers[first:]
+    if sent:
+        buffers = [memoryview(buffers[0]).cast('B')[sent:]] + buffers[1:]
+    return buffers
+
+
+class Connection(object):
+    '''The state of a client connection.'''
+
+    __slots__ = (
+        'sock', 'recv_buffer', 'handshaking', 'trace', 'capture_id', 'busy', 'closed',
+        'request_class', 'request', 'response', 'outgoing',
+    )
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.recv_buffer = io.BytesIO()
+        # what the TLS handshake is waiting for the socket to become, 'read' or 'write', until the
+        # handshake is complete
+        self.handshaking = None
+        # the profiling.RequestTrace of the request in progress, when tracing
+        self.trace = None
+        # the id the connection's events are recorded under, when capturing
+        self.capture_id = None
+        # whether a request is queued or being responded to; no more data is read until it's done
+        self.busy = False
+        self.closed = False
+
+        # the scheduler class of the request being responded to, the request, its response and
+        # the response buffers left to send
+        self.request_class = None
+        self.request = None
+        self.response = None
+        self.outgoing = None
+
+    def fileno(self):
+        return self.sock.fileno()
 
 
 class HttpServer(object):
 
-    def __init__(self, host, port, handler_klass):
+    def __init__(self, host, port, handler_klass, certfile=None, keyfile=None, tracer=None,
+                 capture=None, scheduler=None):
         self.host = host
         self.port = port
         self.handler_klass = handler_klass
-        self.n_requests = 1
+        # how many connections may wait to be accepted; bursts beyond this have their SYNs dropped
+        # and retried by clients a second or more later
+        self.n_requests = socket.SOMAXCONN
+        # a profiling.RequestTracer to record the stages of handling each request with, if any
+        self.tracer = tracer
+        # a capture.TrafficCapture to record the data received on each connection with, if any
+        self.capture = capture
+        # decides the order in which complete requests are handled
+        self.scheduler = scheduler or Scheduler()
+        # how many requests may be handled at once, each in a worker thread, so that CGI scripts and
+        # file reads don't hold up the select loop
+        self.n_workers = 16
+
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.ssl_context = None
+        if certfile:
+            from bespokehttp import tls
+            self.ssl_context = tls.create_ssl_context(certfile, keyfile)
 
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.bind((self.host, self.port, ))
 
-    def serve(self):
+        self.connections = []
+        self.receive, self.send_some = receive, send_some
+
+        # the handlers that workers have finished running, and how many are still running
+        self.handled = deque()
+        self.n_handling = 0
+
+        self._shutdown_requested = False
+        self._stopped = threading.Event()
+
+    def reload_certificate(self, signum=None, frame=None):
+        '''Load the certificate chain and key files again. Connections accepted afterwards use the
+        new certificate; the session cache and ticket keys are kept.
+
+        If the files can't be loaded, log the error and keep using the current certificate.
+        '''
+        from bespokehttp import tls
+
+        try:
+            # check the new files on a scratch context first, so a bad pair can't break the live one
+            tls.create_ssl_context(self.certfile, self.keyfile)
+        except OSError as e:
+            LOG.error('Could not reload certificate {0}: {1}'.format(self.certfile, e))
+            return
+
+        self.ssl_context.load_cert_chain(self.certfile, self.keyfile)
+        LOG.info('Reloaded certificate {}'.format(self.certfile))
+
+    def serve(self, poll_interval=0.5):
+        '''Serve connections until shutdown() is called, checking for it every poll_interval
+        seconds. The server's sockets are closed on the way out.'''
         self.socket.listen(self.n_requests)
-        
-        open_sockets = []
-        recv_buffers = {}
 
-        while True:
+        if self.ssl_context:
+            from bespokehttp import tls
+            self.receive, self.send_some = tls.receive, tls.send_some
 
-            readable, writable, exceptional = select.select([self.socket] + open_sockets, [], [])
+        from concurrent.futures import ThreadPoolExecutor
+        self.workers = ThreadPoolExecutor(self.n_workers)
+        # workers write a byte to the pair when they finish a handler, to wake the select loop
+        self.wakeup, self.wakeup_writer = socket.socketpair()
+        self.wakeup.setblocking(False)
+        self.wakeup_writer.setblocking(False)
 
-            for readable_socket in readable:
+        try:
+            while not self._shutdown_requested:
 
-                if readable_socket is self.socket:
-                    sock, addr = self.socket.accept()
-                    open_sockets.append(sock)
-                    recv_buffers[sock] = io.BytesIO()
+                readers = [self.socket, self.wakeup] + [c for c in self.connections
+                                                        if not c.busy and c.handshaking != 'write']
+                writers = [c for c in self.connections if c.outgoing or c.handshaking == 'write']
 
-                else:
-                    recv_data = readable_socket.recv(1024)
-                    if recv_data:
+                readable, writable, exceptional = select.select(
+                    readers, writers, [], poll_interval)
 
-                        recv_buffers[readable_socket].write(recv_data)
+                for connection in readable:
+                    if connection is self.socket:
+                        self.accept()
+                    elif connection is self.wakeup:
+                        self.finish_handling()
+                    elif not connection.closed:
+                        self.read(connection)
 
-                        request_handler = self.handler_klass(
-                            recv_buffers[readable_socket].getvalue()
-                        )
-                        response = request_handler.handle()
-                        print(response)
-                        if response:
-                            recv_buffers[readable_socket] = io.BytesIO()
-                            readable_socket.sendall(response)
+                for connection in writable:
+                    if connection.closed:
+                        continue
+                    if connection.handshaking:
+                        self.read(connection)
+                    else:
+                        self.write(connection)
 
-if __name__ == '__main__':
+                # start queued requests while there are idle workers to handle them
+                while self.n_handling < self.n_workers:
+                    started = self.scheduler.next()
+                    if started is None:
+                        break
+                    request_class, (connection, data, request) = started
+                    self.respond(connection, request_class, data, request)
+        finally:
+            for connection in list(self.connections):
+                self.close(connection)
+            self.socket.close()
+            self.workers.shutdown()
+            self.wakeup.close()
+            self.wakeup_writer.close()
+            self._stopped.set()
+
+    def shutdown(self):
+        '''Make serve(), running in another thread, return, and wait until it has.'''
+        self._shutdown_requested = True
+        self._stopped.wait()
+
+    def accept(self):
+        '''Accept a connection, wrapping it for a non-blocking TLS handshake if serving HTTPS.'''
+        sock, addr = self.socket.accept()
+        sock.setblocking(False)
+
+        if self.ssl_context:
+            sock = self.ssl_context.wrap_socket(
+                sock, server_side=True, do_handshake_on_connect=False)
+
+        connection = Connection(sock)
+        if self.ssl_context:
+            connection.handshaking = 'read'
+        if self.tracer is not None:
+            connection.trace = self.tracer.begin()
+        if self.capture is not None:
+            connection.capture_id = self.capture.opened()
+
+        self.connections.append(connection)
+        return connection
+
+    def read(self, connection):
+        '''Read what is available on the connection, and queue the request once it is complete.'''
+
+        if connection.handshaking:
+            from bespokehttp import tls
+            try:
+                connection.handshaking = tls.continue_handshake(connection.sock)
+            except OSError as e:
+                LOG.info('TLS handshake failed: {}'.format(e))
+                self.close(connection)
+                return
+
+            if connection.handshaking:
+                return
+            # the client may have sent its request along with the end of the handshake
+
+        try:
+            recv_data = self.receive(connection.sock)
+        except OSError:
+            recv_data = b''
+
+        if recv_data is None:
+            return
+        if not recv_data:
+            self.close(connection)
+            return
+
+        if self.tracer is not None and not connection.recv_buffer.tell():
+            connection.trace.mark('first_byte')
+
+        connection.recv_buffer.write(recv_data)
+        if self.capture is not None:
+            self.capture.received(connection.capture_id, recv_data)
 
-    args = docopt(__doc__)
+        data = connection.recv_buffer.getvalue()
+        length_required = False
+        try:
+            request = HttpRequest(data)
+        except IncompleteRequestError:
+            # keep collecting data from the connection
+            return
+        except InvalidRequestError:
+            # the handler responds to invalid requests
+            request = None
+        except MissingContentLengthError:
+            # there's no telling where the body ends, so there's no request to hand to a handler
+            request = None
+            length_required = True
+        else:
+            if self.tracer is not None:
+                connection.trace.mark('parsed')
 
-    HOST, PORT = 'localhost', int(args['--port'])
-    server = HttpServer(HOST, PORT, CgiRequestHandler)
-    server.serve()
+        connection.recv_buffer = io.BytesIO()
+        connection.busy = True
+        if self.capture is not None:
+            self.capture.responded(connection.capture_id)
+
+        if length_required:
+            self.start_response(connection, None, None, HttpResponse(411))
+            return
+
+        if self.tracer is not None:
+            connection.trace.mark('queued')
+
+        request_class = self.classify(request)
+        if not self.scheduler.enqueue(request_class, (connection, data, request)):
+            LOG.info('Queue for {} requests is full'.format(request_class.name))
+            response = HttpResponse(503, None, {'Retry-After': str(self.scheduler.retry_after)})
+            self.start_response(connection, None, request, response)
+
+    def classify(self, request):
+        '''Return the scheduler class of a parsed request, or of an invalid one if request is None.
+
+        The handler class decides whether the request runs a CGI script, so that a path the handler
+        normalises, e.g. /./cgi-bin/script.py, can't dodge the CGI class's limits. Other requests
+        are classified by the path they resolve to, relative to the working directory, and the size
+        of the file there. That means a stat on the select loop for each request, which is cheap on
+        a local filesystem but would hold up every connection on a slow network one.
+        '''
+        if request is None:
+            return self.scheduler.classify('/')
+
+        try:
+            cgi = self.handler_klass.is_cgi_request(request.path)
+            resource_path, _, _ = self.handler_klass.get_resource_path(request.path)
+        except Exception:
+            # e.g. an empty path; the handler decides how to respond to it
+            return self.scheduler.classify('/')
+
+        if cgi:
+            return self.scheduler.classify(request.path, cgi=True)
+
+        try:
+            size = os.stat(resource_path).st_size
+        except (OSError, ValueError):
+            # e.g. a missing file, or a path with a null byte
+            size = None
+
+        return self.scheduler.classify('/' + os.path.relpath(resource_path), size)
+
+    def respond(self, connection, request_class, data, request):
+        '''Handle a request started by the scheduler in a worker thread. The response is sent by
+        finish_handling() once the worker is done.'''
+        if connection.closed:
+            self.scheduler.finish(request_class)
+            return
+
+        request_handler = self.handler_klass(data, request)
+        if self.tracer is not None:
+            request_handler.trace = connection.trace
+
+        def handled(future):
+            # runs in the worker thread
+            self.handled.append((connection, request_class, request_handler, future))
+            try:
+                self.wakeup_writer.send(b'\0')
+            except BlockingIOError:
+                # the loop has wakeups it hasn't read yet, so it will see this one too
+                pass
+
+        self.n_handling += 1
+        self.workers.submit(request_handler.respond).add_done_callback(handled)
+
+    def finish_handling(self):
+        '''Start sending the responses of the handlers that workers have finished running.'''
+        try:
+            self.wakeup.recv(4096)
+        except BlockingIOError:
+            pass
+
+        while self.handled:
+            connection, request_class, request_handler, future = self.handled.popleft()
+            self.n_handling -= 1
+
+            try:
+                response = future.result()
+            except Exception:
+                LOG.exception('Error handling request')
+                response = HttpResponse(500)
+
+            if connection.closed:
+                self.scheduler.finish(request_class)
+                continue
+
+            self.start_response(connection, request_class, request_handler.request, response)
+
+    def start_response(self, connection, request_class, request, response):
+        connection.request_class = request_class
+        connection.request = request
+        connection.response = response
+        connection.outgoing = response.buffers()
+        if self.tracer is not None:
+            connection.trace.mark('rendered')
+
+        # most responses fit in one slice, so try to send the whole response straight away
+        self.write(connection)
+
+    def write(self, connection):
+        '''Send the next slice of the response to the connection, and finish the response once all
+        of it is sent.'''
+        try:
+            connection.outgoing = self.send_some(
+                connection.sock, connection.outgoing, SEND_SLICE_SIZE)
+        except OSError:
+            self.close(connection)
+            return
+
+        if connection.outgoing:
+            return
+
+        if self.tracer is not None:
+            trace = connection.trace
+            trace.mark('sent')
+            self.tracer.finish(trace, connection.request, connection.response)
+            connection.trace = self.tracer.begin(trace.accepted)
+
+        self.finish_response(connection)
+        connection.busy = False
+
+    def finish_response(self, connection):
+        if connection.request_class is not None:
+            self.scheduler.finish(connection.request_class)
+
+        connection.request_class = None
+        connection.request = None
+        connection.response = None
+        connection.outgoing = None
+
+    def close(self, connection):
+        '''Close a connection and stop tracking it.'''
+        connection.closed = True
+        self.connections.remove(connection)
+        if self.capture is not None:
+            self.capture.closed(connection.capture_id)
+
+        self.finish_response(connection)
+        connection.sock.close()
+
+
+def main(argv=None):
+    import argparse
+    import signal
+
+    parser = argparse.ArgumentParser(prog='bespokehttp', description='A bespoke HTTP server.')
+    parser.add_argument('--port', type=int, default=9191,
+                        help='The port number to listen on (default: %(default)s)')
+    parser.add_argument('--certfile',
+                        help='Serve HTTPS using the PEM certificate chain in this file')
+    parser.add_argument('--keyfile',
+                        help='The PEM private key for the certificate, if not in the certificate file')
+    parser.add_argument('--trace-file',
+                        help='Append a JSON line per request to this file, timing each stage of '
+                             'handling the request')
+    parser.add_argument('--capture-file',
+                        help='Record the data received on each connection, and when it arrived, '
+                             'to this file for replaying with benchmarks/replay.py')
+    parser.add_argument('--profile-dir', default='.',
+                        help='Where to write the stacks sampled by the profiler, which is started '
+                             'by SIGUSR1 (default: the working directory)')
+    parser.add_argument('--profile-seconds', type=float, default=10.0,
+                        help='How long the profiler samples for once started (default: %(default)s)')
+    args = parser.parse_args(argv)
+    if args.keyfile and not args.certfile:
+        parser.error('--keyfile requires --certfile')
+
+    logging.basicConfig(level=logging.INFO)
+
+    from bespokehttp.profiling import SamplingProfiler, RequestTracer
+
+    tracer = RequestTracer(open(args.trace_file, 'a')) if args.trace_file else None
+
+    capture = None
+    if args.capture_file:
+        from bespokehttp.capture import TrafficCapture
+        capture = TrafficCapture(open(args.capture_file, 'wb'))
+
+    HOST, PORT = 'localhost', args.port
+    server = HttpServer(HOST, PORT, CgiRequestHandler,
+                        certfile=args.certfile, keyfile=args.keyfile, tracer=tracer,
+                        capture=capture)
+
+    if server.ssl_context and hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, server.reload_certificate)
+
+    if hasattr(signal, 'SIGUSR1'):
+        profiler = SamplingProfiler(args.profile_dir, args.profile_seconds)
+        signal.signal(signal.SIGUSR1, profiler.handle_signal)
+
+    try:
+        server.serve()
+    finally:
+        if capture is not None:
+            capture.output_file.close()
+
+if __name__ == '__main__':
+    main()
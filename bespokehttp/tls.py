@@ -0,0 +1,69 @@
+'''TLS support for HttpServer.
+
+This module is only imported when the server is given a certificate, since importing ssl is
+a noticeable part of the server's startup time.
+'''
+import ssl
+
+
+# the application protocols offered during the TLS handshake; HTTP/1.0 responses are valid replies
+# to HTTP/1.1 clients
+ALPN_PROTOCOLS = ('http/1.1', 'http/1.0', )
+
+
+def create_ssl_context(certfile, keyfile=None, alpn_protocols=ALPN_PROTOCOLS):
+    '''Return a server-side SSLContext for the given certificate chain and private key.
+
+    OpenSSL keeps a server-side session cache and issues session tickets by default, so clients
+    that reconnect can resume their session without a full handshake.
+    '''
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.options &= ~ssl.OP_NO_TICKET
+    context.load_cert_chain(certfile, keyfile)
+    if ssl.HAS_ALPN:
+        context.set_alpn_protocols(list(alpn_protocols))
+    return context
+
+
+def continue_handshake(sock):
+    '''Advance the TLS handshake on the socket as far as it can go without blocking.
+
+    Returns None when the handshake is complete, or 'read' or 'write' for what the handshake is
+    waiting for the socket to become.
+    '''
+    try:
+        sock.do_handshake()
+    except ssl.SSLWantReadError:
+        return 'read'
+    except ssl.SSLWantWriteError:
+        return 'write'
+
+
+def receive(sock):
+    '''Return the data available on the connection, b'' if the peer closed it, or None if no
+    application data is ready yet.'''
+    try:
+        chunks = [sock.recv(1024)]
+    except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+        return None
+
+    # decrypted data left in the TLS buffer won't make the socket selectable again
+    while chunks[-1] and sock.pending():
+        chunks.append(sock.recv(sock.pending()))
+
+    return b''.join(chunks)
+
+
+def send_some(sock, buffers, limit):
+    '''Write up to limit bytes from the start of the buffers to the non-blocking TLS socket, and
+    return the buffers that are left to write. TLS sockets can't scatter-gather, so this writes from
+    the first buffer only.'''
+    first = memoryview(buffers[0]).cast('B')
+    try:
+        sent = sock.send(first[:limit])
+    except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+        return buffers
+
+    if sent < len(first):
+        return [first[sent:]] + buffers[1:]
+    return buffers[1:]
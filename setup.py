@@ -10,9 +10,6 @@ setup(
     license='MIT',
 
     packages=find_packages(),
-    install_requires=[
-        'docopt'
-    ],
     extras_require={
         'test': ['pytest'],
     },
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+from bespokehttp.autoindex import DirectoryIndex
+
+
+class DirectoryIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = self.tempdir.name
+        for name in ('a.txt', 'b&c.txt', 'd e.txt'):
+            open(os.path.join(self.path, name), 'w').close()
+        os.mkdir(os.path.join(self.path, 'sub'))
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_lists_entries(self):
+        index = DirectoryIndex()
+        page = b''.join(index.render(self.path, '/files'))
+
+        self.assertIn(b'<title>Index of /files/</title>', page)
+        self.assertIn(b'<a href="/">../</a>', page)
+        self.assertIn(b'<a href="/files/a.txt">a.txt</a>', page)
+        self.assertIn(b'<a href="/files/b%26c.txt">b&amp;c.txt</a>', page)
+        self.assertIn(b'<a href="/files/d%20e.txt">d e.txt</a>', page)
+        self.assertIn(b'<a href="/files/sub/">sub/</a>', page)
+        self.assertNotIn(b'?page=', page)
+
+    def test_paginates_entries(self):
+        index = DirectoryIndex(page_size=3)
+
+        first = b''.join(index.render(self.path, '/', 1))
+        self.assertEqual(first.count(b'<li>'), 3)
+        self.assertIn(b'<a href="/?page=2">next</a>', first)
+        self.assertNotIn(b'previous', first)
+
+        second = b''.join(index.render(self.path, '/', 2))
+        self.assertEqual(second.count(b'<li>'), 1)
+        self.assertIn(b'<a href="/?page=1">previous</a>', second)
+        self.assertNotIn(b'next', second)
+
+        with self.assertRaises(IndexError):
+            index.render(self.path, '/', 3)
+        with self.assertRaises(IndexError):
+            index.render(self.path, '/', 0)
+
+    def test_cache_is_invalidated_when_directory_changes(self):
+        index = DirectoryIndex()
+        first = index.render(self.path, '/')
+        self.assertIs(index.render(self.path, '/'), first)
+
+        open(os.path.join(self.path, 'new.txt'), 'w').close()
+        # make sure the modification time changes even on filesystems with coarse timestamps
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        second = index.render(self.path, '/')
+        self.assertIsNot(second, first)
+        self.assertIn(b'new.txt', b''.join(second))
+
+    def test_cache_is_bounded(self):
+        index = DirectoryIndex(max_cached_pages=1)
+        first = index.render(self.path, '/one')
+        index.render(self.path, '/two')
+        self.assertIsNot(index.render(self.path, '/one'), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
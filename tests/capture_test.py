@@ -0,0 +1,79 @@
+import io
+import socket
+import time
+import unittest
+
+from bespokehttp.capture import (
+    TrafficCapture,
+    InvalidCaptureError,
+    read_capture,
+    OPENED,
+    RECEIVED,
+    RESPONDED,
+    CLOSED,
+)
+from tests.server_test import start_server
+
+
+class TrafficCaptureTestCase(unittest.TestCase):
+
+    def test_records_can_be_read_back(self):
+        output_file = io.BytesIO()
+        capture = TrafficCapture(output_file)
+        connection_id = capture.opened()
+        capture.received(connection_id, b'GET / HT')
+        capture.received(connection_id, b'TP/1.0\r\n\r\n')
+        capture.responded(connection_id)
+        capture.closed(connection_id)
+
+        records = list(read_capture(io.BytesIO(output_file.getvalue())))
+        self.assertEqual([(kind, connection, data) for kind, connection, _, data in records], [
+            (OPENED, connection_id, b''),
+            (RECEIVED, connection_id, b'GET / HT'),
+            (RECEIVED, connection_id, b'TP/1.0\r\n\r\n'),
+            (RESPONDED, connection_id, b''),
+            (CLOSED, connection_id, b''),
+        ])
+        times = [timestamp for _, _, timestamp, _ in records]
+        self.assertEqual(times, sorted(times))
+
+    def test_truncated_capture_ends_at_last_whole_record(self):
+        output_file = io.BytesIO()
+        capture = TrafficCapture(output_file)
+        connection_id = capture.opened()
+        capture.received(connection_id, b'GET / HTTP/1.0\r\n\r\n')
+
+        records = list(read_capture(io.BytesIO(output_file.getvalue()[:-1])))
+        self.assertEqual([kind for kind, _, _, _ in records], [OPENED])
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(InvalidCaptureError):
+            list(read_capture(io.BytesIO(b'GET / HTTP/1.0\r\n\r\n')))
+
+    def test_server_records_fragments(self):
+        output_file = io.BytesIO()
+        server = start_server(self, capture=TrafficCapture(output_file))
+
+        with socket.create_connection(server.socket.getsockname(), timeout=10) as sock:
+            sock.sendall(b'GET nonexistent HT')
+            time.sleep(0.05)
+            sock.sendall(b'TP/1.0\r\n\r\n')
+            sock.recv(1024)
+
+        deadline = time.monotonic() + 10
+        records = []
+        while (not records or records[-1][0] != CLOSED) and time.monotonic() < deadline:
+            time.sleep(0.01)
+            records = list(read_capture(io.BytesIO(output_file.getvalue())))
+
+        self.assertEqual([(kind, data) for kind, _, _, data in records], [
+            (OPENED, b''),
+            (RECEIVED, b'GET nonexistent HT'),
+            (RECEIVED, b'TP/1.0\r\n\r\n'),
+            (RESPONDED, b''),
+            (CLOSED, b''),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
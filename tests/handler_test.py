@@ -37,6 +37,30 @@ class HttpRequestHandlerTestCase(unittest.TestCase):
 
         shutil.rmtree(tempdir)
 
+    def test_responds_with_listing_to_request_for_directory(self):
+        with tempfile.TemporaryDirectory(dir='./') as tempdir:
+            open(os.path.join(tempdir, 'resource.txt'), 'w').close()
+
+            request = 'GET {} HTTP/1.0\r\n\r\n'.format(tempdir[1:]).encode()
+            response = HttpRequestHandler(request).handle()
+            self.assertTrue(response.startswith(b'HTTP/1.0 200 OK'))
+            self.assertIn(b'Content-Type: text/html; charset=utf-8', response)
+            self.assertIn('{}/resource.txt"'.format(tempdir[1:]).encode(), response)
+
+            request = 'GET {}?page=2 HTTP/1.0\r\n\r\n'.format(tempdir[1:]).encode()
+            response = HttpRequestHandler(request).handle()
+            self.assertTrue(response.startswith(b'HTTP/1.0 404 Not Found'))
+
+            request = 'GET {}?page=x HTTP/1.0\r\n\r\n'.format(tempdir[1:]).encode()
+            response = HttpRequestHandler(request).handle()
+            self.assertTrue(response.startswith(b'HTTP/1.0 400 Bad Request'))
+
+    def test_responds_403_to_request_for_directory_outside_working_directory(self):
+        for path in ('/../', '/../../', '/%2e%2e/'):
+            request = 'GET {} HTTP/1.0\r\n\r\n'.format(path).encode()
+            response = HttpRequestHandler(request).handle()
+            self.assertTrue(response.startswith(b'HTTP/1.0 403 Forbidden'))
+
     def test_responds_404_to_request_for_file(self):
         request = b'GET nonexistent HTTP/1.0\r\n\r\n'
         handler = HttpRequestHandler(request)
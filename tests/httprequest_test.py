@@ -73,6 +73,19 @@ class HttpRequestTestCase(unittest.TestCase):
         self.assertEqual(request.content_length, 2)
         self.assertEqual(request.body, b'ab')
 
+    def test_header_lookup_is_case_insensitive(self):
+        request_message = b'POST /abc/def.html HTTP/1.0\r\ncontent-length: 2\r\nX-Foo:bar\r\n\r\nab'
+        request = HttpRequest(request_message)
+        self.assertEqual(request.content_length, 2)
+        self.assertEqual(request.headers[b'Content-Length'], b'2')
+        self.assertEqual(request.headers[b'x-foo'], b'bar')
+        self.assertEqual(request.headers['X-FOO'], b'bar')
+        self.assertIn(b'X-Foo', request.headers)
+        self.assertNotIn(b'X-Bar', request.headers)
+        self.assertEqual(list(request.headers), [b'content-length', b'X-Foo'])
+        self.assertEqual(request.request_line, b'POST /abc/def.html HTTP/1.0\r\n')
+        self.assertEqual(request.header_lines, [b'content-length: 2\r\n', b'X-Foo:bar\r\n'])
+
     def test_incomplete_requests_cause_exception(self):
         request = b'G'
         with self.assertRaises(IncompleteRequestError):
@@ -139,6 +152,11 @@ class HttpRequestTestCase(unittest.TestCase):
         with self.assertRaises(InvalidRequestError):
             HttpRequest(request)
 
+        for content_length in (b'abc', b'-1', b'1_0', b''):
+            request = b'POST /abc/def.html HTTP/1.0\r\nContent-Length:' + content_length + b'\r\n\r\n'
+            with self.assertRaises(InvalidRequestError):
+                HttpRequest(request)
+
     def test_post_request_requires_content_length(self):
         request = b'POST /abc/def.html HTTP/1.0\r\n\r\na'
         with self.assertRaises(MissingContentLengthError):
@@ -22,5 +22,36 @@ class HttpResponseTestCase(unittest.TestCase):
         response = HttpResponse(200, 'ABCD', {'Server': 'notapache'})
         self.assertEqual(response.headers['Server'], 'notapache')
 
+    def test_render(self):
+        response = HttpResponse(200, b'ABCD', {'Server': 'notapache'})
+        expected = (b'HTTP/1.0 200 OK\r\n'
+                    b'Connection: close\r\n'
+                    b'Server: notapache\r\n'
+                    b'Content-Length: 4\r\n'
+                    b'\r\n'
+                    b'ABCD')
+        self.assertEqual(response.render(), expected)
+
+        response = HttpResponse(404)
+        self.assertEqual(response.render(),
+                         b'HTTP/1.0 404 Not Found\r\nConnection: close\r\nServer: bespokehttp\r\n\r\n')
+
+    def test_buffers_do_not_copy_content(self):
+        content = b'ABCD'
+        response = HttpResponse(200, content)
+        header, body = response.buffers()
+        self.assertTrue(header.startswith(b'HTTP/1.0 200 OK\r\n'))
+        self.assertTrue(header.endswith(b'\r\n\r\n'))
+        self.assertIs(body.obj, content)
+
+        response = HttpResponse(404)
+        self.assertEqual(response.buffers(), [response.render()])
+
+    def test_content_can_be_a_sequence_of_chunks(self):
+        response = HttpResponse(200, (b'AB', b'', b'CDE'))
+        self.assertEqual(response.headers['Content-Length'], '5')
+        self.assertEqual(len(response.buffers()), 4)
+        self.assertTrue(response.render().endswith(b'\r\n\r\nABCDE'))
+
 if __name__ == '__main__':
     unittest.main()
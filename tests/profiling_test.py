@@ -0,0 +1,91 @@
+import io
+import json
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from bespokehttp.profiling import SamplingProfiler, RequestTracer
+from tests.server_test import start_server
+
+
+def busy_wait(event):
+    while not event.is_set():
+        pass
+
+
+class SamplingProfilerTestCase(unittest.TestCase):
+
+    def test_writes_collapsed_stacks(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=busy_wait, args=(stop, ))
+        thread.start()
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            profiler = SamplingProfiler(tempdir, duration=0.1, interval=0.001)
+            try:
+                path = profiler.run(thread.ident)
+            finally:
+                stop.set()
+                thread.join()
+
+            with open(path) as f:
+                lines = f.read().splitlines()
+
+        self.assertTrue(lines)
+        stack, _, count = lines[0].rpartition(' ')
+        self.assertTrue(int(count) > 0)
+        self.assertIn(';busy_wait (', stack)
+
+    def test_samples_every_thread_by_default(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=busy_wait, args=(stop, ))
+        thread.start()
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            profiler = SamplingProfiler(tempdir, duration=0.1, interval=0.001)
+            try:
+                path = profiler.run()
+            finally:
+                stop.set()
+                thread.join()
+
+            with open(path) as f:
+                stacks = [line.rpartition(' ')[0] for line in f.read().splitlines()]
+
+        self.assertTrue(any(';busy_wait (' in stack for stack in stacks))
+
+    def test_only_one_sampler_runs_at_a_time(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            profiler = SamplingProfiler(tempdir, duration=0.05)
+            self.assertTrue(profiler.start())
+            self.assertFalse(profiler.start())
+            profiler._sampler.join()
+            self.assertFalse(profiler.running)
+
+
+class RequestTracerTestCase(unittest.TestCase):
+
+    def test_records_each_stage_of_a_request(self):
+        output_file = io.StringIO()
+        server = start_server(self, tracer=RequestTracer(output_file))
+
+        with socket.create_connection(server.socket.getsockname(), timeout=10) as sock:
+            sock.sendall(b'GET nonexistent HTTP/1.0\r\n\r\n')
+            sock.recv(1024)
+
+        deadline = time.monotonic() + 10
+        while not output_file.getvalue() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        record = json.loads(output_file.getvalue().splitlines()[0])
+        self.assertEqual(record['path'], 'nonexistent')
+        self.assertEqual(record['status'], 404)
+        stages = ['first_byte', 'parsed', 'queued', 'dispatched', 'rendered', 'sent']
+        timings = [record[stage] for stage in stages]
+        self.assertEqual(timings, sorted(timings))
+
+
+if __name__ == '__main__':
+    unittest.main()
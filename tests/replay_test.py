@@ -0,0 +1,139 @@
+import os
+import socket
+import tempfile
+import time
+import unittest
+
+from benchmarks.replay import load_connections, response_length, replay
+from bespokehttp.capture import TrafficCapture, read_capture, OPENED, RECEIVED, CLOSED
+from tests.server_test import start_server
+
+
+def wait_for_closed(capture_path, n_connections):
+    '''Wait until the capture file records n_connections closed connections.'''
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        with open(capture_path, 'rb') as f:
+            if sum(1 for kind, _, _, _ in read_capture(f) if kind == CLOSED) >= n_connections:
+                return
+        time.sleep(0.01)
+    raise AssertionError('Capture did not record {} closed connections'.format(n_connections))
+
+
+class ResponseLengthTestCase(unittest.TestCase):
+
+    def test_partial_headers(self):
+        self.assertIsNone(response_length(b'HTTP/1.0 200 OK\r\nContent-Len'))
+        self.assertIsNone(response_length(b'HTTP/1.0 200 OK\r\nContent-Length: 5\r\n\r'))
+
+    def test_body_split_across_reads(self):
+        data = b'HTTP/1.0 200 OK\r\nContent-Length: 5\r\n\r\nab'
+        self.assertIsNone(response_length(data))
+        data += b'cde'
+        self.assertEqual(response_length(data), len(data))
+
+    def test_response_without_content_length_ends_with_headers(self):
+        data = b'HTTP/1.0 404 Not Found\r\nServer: bespokehttp\r\n\r\n'
+        self.assertEqual(response_length(data), len(data))
+
+    def test_two_responses_in_one_buffer(self):
+        first = b'HTTP/1.0 200 OK\r\ncontent-length: 3\r\n\r\nabc'
+        second = b'HTTP/1.0 200 OK\r\nContent-Length: 2\r\n\r\nde'
+        data = first + second
+
+        self.assertEqual(response_length(data), len(first))
+        self.assertEqual(response_length(data[len(first):]), len(second))
+
+
+class LoadConnectionsTestCase(unittest.TestCase):
+
+    def test_marks_fragments_that_complete_requests(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            capture_path = os.path.join(tempdir, 'capture')
+            with open(capture_path, 'wb') as f:
+                capture = TrafficCapture(f)
+                first = capture.opened()
+                second = capture.opened()
+                capture.received(first, b'GET / HT')
+                capture.received(second, b'GET /other HTTP/1.0\r\n\r\n')
+                capture.responded(second)
+                capture.received(first, b'TP/1.0\r\n\r\n')
+                capture.responded(first)
+                capture.closed(second)
+                capture.closed(first)
+
+            connections = load_connections(capture_path)
+
+        self.assertEqual(
+            [[(kind, data, completes_request) for _, kind, data, completes_request
+              in connection.events] for connection in connections], [
+            [
+                (OPENED, b'', False),
+                (RECEIVED, b'GET / HT', False),
+                (RECEIVED, b'TP/1.0\r\n\r\n', True),
+                (CLOSED, b'', False),
+            ],
+            [
+                (OPENED, b'', False),
+                (RECEIVED, b'GET /other HTTP/1.0\r\n\r\n', True),
+                (CLOSED, b'', False),
+            ],
+        ])
+
+
+class ReplayTestCase(unittest.TestCase):
+
+    def test_replays_captured_traffic(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            capture_path = os.path.join(tempdir, 'capture')
+            with open(capture_path, 'wb') as capture_file:
+                server = start_server(self, capture=TrafficCapture(capture_file))
+                address = server.socket.getsockname()
+
+                with socket.create_connection(address, timeout=10) as sock:
+                    sock.sendall(b'GET nonexistent HT')
+                    time.sleep(0.05)
+                    sock.sendall(b'TP/1.0\r\n\r\n')
+                    sock.recv(1024)
+
+                with socket.create_connection(address, timeout=10) as sock:
+                    sock.sendall(b'GET other HTTP/1.0\r\n\r\n')
+                    sock.recv(1024)
+
+                wait_for_closed(capture_path, 2)
+
+            connections = load_connections(capture_path)
+
+        address = start_server(self).socket.getsockname()
+        latencies, errors, duration = replay(connections, address, speed=10)
+
+        self.assertEqual(len(latencies), 2)
+        self.assertEqual(errors, 0)
+        for latency in latencies:
+            self.assertGreaterEqual(latency, 0)
+            self.assertLess(latency, duration)
+
+    def test_counts_requests_to_unreachable_server_as_errors(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            capture_path = os.path.join(tempdir, 'capture')
+            with open(capture_path, 'wb') as f:
+                capture = TrafficCapture(f)
+                connection_id = capture.opened()
+                capture.received(connection_id, b'GET / HTTP/1.0\r\n\r\n')
+                capture.responded(connection_id)
+                capture.closed(connection_id)
+
+            connections = load_connections(capture_path)
+
+        # find a port that nothing is listening on
+        with socket.socket() as sock:
+            sock.bind(('localhost', 0))
+            address = sock.getsockname()
+
+        latencies, errors, _ = replay(connections, address, speed=1)
+        self.assertEqual(latencies, [])
+        self.assertEqual(errors, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
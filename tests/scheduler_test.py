@@ -0,0 +1,81 @@
+import unittest
+
+from bespokehttp.scheduler import Scheduler, RequestClass
+
+
+class SchedulerTestCase(unittest.TestCase):
+
+    def test_classify(self):
+        scheduler = Scheduler(path_prefixes=[('/big/', 'large')], large_size=100)
+        self.assertEqual(scheduler.classify('/cgi-bin/script.py', cgi=True).name, 'cgi')
+        self.assertEqual(scheduler.classify('/big/file.txt', 1, cgi=True).name, 'cgi')
+        self.assertEqual(scheduler.classify('big/file.txt').name, 'large')
+        self.assertEqual(scheduler.classify('/big/file.txt', 1).name, 'large')
+        self.assertEqual(scheduler.classify('/file.txt', 101).name, 'large')
+        self.assertEqual(scheduler.classify('/file.txt', 100).name, 'small')
+        self.assertEqual(scheduler.classify('/file.txt').name, 'small')
+
+    def test_classes_share_by_weight(self):
+        heavy = RequestClass('heavy', weight=3)
+        light = RequestClass('light', weight=1)
+        scheduler = Scheduler(classes=[heavy, light])
+        for i in range(8):
+            scheduler.enqueue(heavy, i)
+            scheduler.enqueue(light, i)
+
+        started = []
+        for _ in range(8):
+            request_class, _ = scheduler.next()
+            started.append(request_class.name)
+            scheduler.finish(request_class)
+
+        self.assertEqual(started.count('heavy'), 6)
+        self.assertEqual(started.count('light'), 2)
+
+    def test_idle_class_does_not_bank_turns(self):
+        busy = RequestClass('busy', weight=1)
+        idle = RequestClass('idle', weight=1)
+        scheduler = Scheduler(classes=[busy, idle])
+        for i in range(10):
+            scheduler.enqueue(busy, i)
+        for _ in range(5):
+            request_class, _ = scheduler.next()
+            scheduler.finish(request_class)
+
+        for i in range(10):
+            scheduler.enqueue(idle, i)
+
+        started = []
+        for _ in range(4):
+            request_class, _ = scheduler.next()
+            started.append(request_class.name)
+            scheduler.finish(request_class)
+
+        self.assertEqual(started.count('busy'), 2)
+        self.assertEqual(started.count('idle'), 2)
+
+    def test_limits_active_requests(self):
+        cgi = RequestClass('cgi', max_active=1)
+        scheduler = Scheduler(classes=[cgi])
+        scheduler.enqueue(cgi, 'first')
+        scheduler.enqueue(cgi, 'second')
+
+        self.assertEqual(scheduler.next(), (cgi, 'first'))
+        self.assertFalse(scheduler.ready)
+        self.assertIsNone(scheduler.next())
+
+        scheduler.finish(cgi)
+        self.assertTrue(scheduler.ready)
+        self.assertEqual(scheduler.next(), (cgi, 'second'))
+
+    def test_limits_queued_requests(self):
+        small = RequestClass('small', max_queued=2)
+        scheduler = Scheduler(classes=[small])
+        self.assertTrue(scheduler.enqueue(small, 1))
+        self.assertTrue(scheduler.enqueue(small, 2))
+        self.assertFalse(scheduler.enqueue(small, 3))
+        self.assertEqual(len(small.queue), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,313 @@
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from bespokehttp.handler import HttpRequestHandler, CgiRequestHandler
+from bespokehttp.httprequest import HttpRequest
+from bespokehttp.scheduler import Scheduler, RequestClass
+from bespokehttp.server import HttpServer, send_some
+
+
+class PartialWriteSocket(object):
+    '''A socket stand-in whose sendmsg writes at most a few bytes per call.'''
+
+    def __init__(self, max_write):
+        self.max_write = max_write
+        self.written = b''
+        self.calls = 0
+
+    def sendmsg(self, buffers):
+        self.calls += 1
+        data = b''.join(bytes(buffer) for buffer in buffers)[:self.max_write]
+        self.written += data
+        return len(data)
+
+
+def start_server(test_case, handler_klass=HttpRequestHandler, **kwargs):
+    '''Start an HttpServer on an unused port in a thread, and return it. The server is shut down
+    when the test case finishes.'''
+    server = HttpServer('localhost', 0, handler_klass, **kwargs)
+    # listen before the thread starts so that clients can connect straight away
+    server.socket.listen(server.n_requests)
+    threading.Thread(target=server.serve, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    test_case.addCleanup(server.shutdown)
+    return server
+
+
+class BlockingRequestHandler(HttpRequestHandler):
+    '''Doesn't respond to requests for /block until the release event is set.'''
+
+    release = None
+
+    def respond_to_GET(self):
+        if self.request.path == '/block':
+            self.release.wait(10)
+        return super().respond_to_GET()
+
+
+def make_certificate(directory):
+    '''Write a self-signed certificate for localhost and its key to the directory, and return the
+    paths of the certificate and key files.'''
+    certfile = os.path.join(directory, 'cert.pem')
+    keyfile = os.path.join(directory, 'key.pem')
+    subprocess.check_call(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+         '-subj', '/CN=localhost', '-keyout', keyfile, '-out', certfile],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return certfile, keyfile
+
+
+def read_certificate(certfile):
+    '''Return the DER bytes of the certificate in the PEM file.'''
+    import ssl
+    with open(certfile) as f:
+        return ssl.PEM_cert_to_DER_cert(f.read())
+
+
+def get_peer_certificate(address, cafile):
+    '''Make a request to the TLS server at address, trusting the certificate in cafile, and return
+    the DER bytes of the certificate the server presented.'''
+    import ssl
+    context = ssl.create_default_context(cafile=cafile)
+    with socket.create_connection(address, timeout=10) as raw_sock:
+        with context.wrap_socket(raw_sock, server_hostname='localhost') as sock:
+            sock.sendall(b'GET nonexistent HTTP/1.0\r\n\r\n')
+            if not sock.recv(1024).startswith(b'HTTP/1.0 404 Not Found'):
+                raise AssertionError('Unexpected response from TLS server')
+            return sock.getpeercert(binary_form=True)
+
+
+class HttpServerTestCase(unittest.TestCase):
+
+    def test_send_some_handles_partial_writes(self):
+        buffers = [b'HTTP/1.0 200 OK\r\n\r\n', b'', memoryview(b'abcdefg'), b'hij']
+        sock = PartialWriteSocket(max_write=4)
+        left = buffers
+        while left:
+            left = send_some(sock, left, 1024)
+        self.assertEqual(sock.written, b''.join(bytes(buffer) for buffer in buffers))
+
+    def test_send_some_writes_buffers_in_one_call(self):
+        sock = PartialWriteSocket(max_write=1024)
+        self.assertEqual(send_some(sock, [b'abc', b'def', b'ghi'], 1024), [])
+        self.assertEqual(sock.written, b'abcdefghi')
+        self.assertEqual(sock.calls, 1)
+
+    def test_send_some_stops_at_limit(self):
+        sock = PartialWriteSocket(max_write=1024)
+        left = send_some(sock, [b'abc', b'def', b'ghi'], 4)
+        self.assertEqual(sock.written, b'abcd')
+        self.assertEqual(b''.join(bytes(buffer) for buffer in left), b'efghi')
+
+    def test_import_does_not_load_optional_modules(self):
+        # run in a fresh interpreter, since other tests import these modules
+        output = subprocess.check_output([sys.executable, '-c', '''if True:
+            import sys
+            import bespokehttp.server
+            print(' '.join(sorted({'ssl', 'mimetypes', 'tempfile'} & set(sys.modules))))
+        '''])
+        self.assertEqual(output.strip(), b'')
+
+    def test_serves_requests(self):
+        address = start_server(self).socket.getsockname()
+        with socket.create_connection(address, timeout=10) as sock:
+            sock.sendall(b'GET nonexistent HTTP/1.0\r\n\r\n')
+            self.assertTrue(sock.recv(1024).startswith(b'HTTP/1.0 404 Not Found'))
+
+    def test_keeps_serving_after_requests_for_unusable_paths(self):
+        address = start_server(self).socket.getsockname()
+        for request, status_line in (
+                (b'FOO  HTTP/1.0\r\n\r\n', b'HTTP/1.0 405'),
+                (b'PUT /a%00b HTTP/1.0\r\n\r\n', b'HTTP/1.0 405'),
+                (b'POST / HTTP/1.0\r\n\r\n', b'HTTP/1.0 411 Length Required'),
+                (b'POST / HTTP/1.0\r\nContent-Length: abc\r\n\r\n', b'HTTP/1.0 400 Bad Request'),
+        ):
+            with socket.create_connection(address, timeout=10) as sock:
+                sock.sendall(request)
+                self.assertTrue(sock.recv(1024).startswith(status_line))
+
+        with socket.create_connection(address, timeout=10) as sock:
+            sock.sendall(b'GET nonexistent HTTP/1.0\r\n\r\n')
+            self.assertTrue(sock.recv(1024).startswith(b'HTTP/1.0 404 Not Found'))
+
+    def test_responds_500_when_handler_fails(self):
+        address = start_server(self).socket.getsockname()
+        with socket.create_connection(address, timeout=10) as sock:
+            # opening a path with a null byte raises ValueError
+            sock.sendall(b'GET /a%00b HTTP/1.0\r\n\r\n')
+            self.assertTrue(sock.recv(1024).startswith(b'HTTP/1.0 500 Internal Server Error'))
+
+        with socket.create_connection(address, timeout=10) as sock:
+            sock.sendall(b'GET nonexistent HTTP/1.0\r\n\r\n')
+            self.assertTrue(sock.recv(1024).startswith(b'HTTP/1.0 404 Not Found'))
+
+    def test_slow_handler_does_not_block_other_requests(self):
+        handler_klass = type('Handler', (BlockingRequestHandler, ), {'release': threading.Event()})
+        address = start_server(self, handler_klass).socket.getsockname()
+        self.addCleanup(handler_klass.release.set)
+
+        with socket.create_connection(address, timeout=10) as blocked:
+            blocked.sendall(b'GET /block HTTP/1.0\r\n\r\n')
+
+            with socket.create_connection(address, timeout=10) as sock:
+                sock.sendall(b'GET nonexistent HTTP/1.0\r\n\r\n')
+                self.assertTrue(sock.recv(1024).startswith(b'HTTP/1.0 404 Not Found'))
+
+            handler_klass.release.set()
+            self.assertTrue(blocked.recv(1024).startswith(b'HTTP/1.0 404 Not Found'))
+
+    def test_class_limits_how_many_handlers_run_at_once(self):
+        handler_klass = type('Handler', (BlockingRequestHandler, ), {'release': threading.Event()})
+        scheduler = Scheduler(classes=[
+            RequestClass('small', max_active=1), RequestClass('large'), RequestClass('cgi')])
+        address = start_server(self, handler_klass, scheduler=scheduler).socket.getsockname()
+        self.addCleanup(handler_klass.release.set)
+
+        with socket.create_connection(address, timeout=10) as blocked:
+            blocked.sendall(b'GET /block HTTP/1.0\r\n\r\n')
+
+            with socket.create_connection(address, timeout=0.2) as sock:
+                sock.sendall(b'GET nonexistent HTTP/1.0\r\n\r\n')
+                with self.assertRaises(socket.timeout):
+                    sock.recv(1024)
+
+                handler_klass.release.set()
+                sock.settimeout(10)
+                self.assertTrue(sock.recv(1024).startswith(b'HTTP/1.0 404 Not Found'))
+
+    def test_classifies_requests_by_the_path_the_handler_resolves(self):
+        handler_klass = type('Handler', (CgiRequestHandler, ),
+                             {'cgi_directory': os.path.abspath('cgi-bin')})
+        server = HttpServer('localhost', 0, handler_klass)
+        self.addCleanup(server.socket.close)
+
+        for path, class_name in (
+                ('/cgi-bin/script.py', 'cgi'),
+                ('/./cgi-bin/script.py', 'cgi'),
+                ('/foo/../cgi-bin/script.py', 'cgi'),
+                ('cgi-bin/script.py/path/info', 'cgi'),
+                ('/cgi-bin/../README.md', 'small'),
+                ('/nonexistent', 'small'),
+        ):
+            request = HttpRequest('GET {} HTTP/1.0\r\n\r\n'.format(path).encode())
+            self.assertEqual(server.classify(request).name, class_name, path)
+
+    def test_responds_503_when_queue_is_full(self):
+        scheduler = Scheduler(classes=[
+            RequestClass('small', max_queued=0), RequestClass('large'), RequestClass('cgi')])
+        address = start_server(self, scheduler=scheduler).socket.getsockname()
+        with socket.create_connection(address, timeout=10) as sock:
+            sock.sendall(b'GET nonexistent HTTP/1.0\r\n\r\n')
+            response = sock.recv(1024)
+
+        self.assertTrue(response.startswith(b'HTTP/1.0 503 Service Unavailable'))
+        self.assertIn(b'\r\nRetry-After: 1\r\n', response)
+
+    def test_large_response_does_not_block_small_one(self):
+        with tempfile.TemporaryDirectory(dir='./') as tempdir:
+            with open(os.path.join(tempdir, 'large.bin'), 'wb') as f:
+                f.write(b'x' * 32 * 1024 * 1024)
+            with open(os.path.join(tempdir, 'small.txt'), 'wb') as f:
+                f.write(b'small')
+
+            address = start_server(self).socket.getsockname()
+            with socket.create_connection(address, timeout=10) as large:
+                # ask for the large file, but don't read it, so the server can't finish sending it
+                large.sendall('GET {}/large.bin HTTP/1.0\r\n\r\n'.format(tempdir[1:]).encode())
+
+                with socket.create_connection(address, timeout=10) as small:
+                    small.sendall('GET {}/small.txt HTTP/1.0\r\n\r\n'.format(tempdir[1:]).encode())
+                    response = b''
+                    while not response.endswith(b'small'):
+                        response += small.recv(1024)
+
+        self.assertTrue(response.startswith(b'HTTP/1.0 200 OK'))
+
+    @unittest.skipUnless(shutil.which('openssl'), 'needs openssl to make a self-signed certificate')
+    def test_serves_requests_over_tls(self):
+        import ssl
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            certfile, keyfile = make_certificate(tempdir)
+            address = start_server(self, certfile=certfile, keyfile=keyfile).socket.getsockname()
+            context = ssl.create_default_context(cafile=certfile)
+            context.set_alpn_protocols(['h2', 'http/1.1'])
+
+        session = None
+        for _ in range(2):
+            with socket.create_connection(address, timeout=10) as raw_sock:
+                with context.wrap_socket(raw_sock, server_hostname='localhost',
+                                         session=session) as sock:
+                    sock.sendall(b'GET nonexistent HTTP/1.0\r\n\r\n')
+                    self.assertTrue(sock.recv(1024).startswith(b'HTTP/1.0 404 Not Found'))
+                    self.assertEqual(sock.selected_alpn_protocol(), 'http/1.1')
+                    session_reused = sock.session_reused
+                    session = sock.session
+
+        self.assertTrue(session_reused)
+
+    @unittest.skipUnless(shutil.which('openssl'), 'needs openssl to make a self-signed certificate')
+    def test_reload_certificate_uses_new_certificate_for_new_connections(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            certfile, keyfile = make_certificate(tempdir)
+            server = start_server(self, certfile=certfile, keyfile=keyfile)
+            address = server.socket.getsockname()
+            self.assertEqual(get_peer_certificate(address, certfile), read_certificate(certfile))
+
+            new_directory = os.path.join(tempdir, 'new')
+            os.mkdir(new_directory)
+            server.certfile, server.keyfile = make_certificate(new_directory)
+            server.reload_certificate()
+
+            self.assertEqual(get_peer_certificate(address, server.certfile),
+                             read_certificate(server.certfile))
+
+    @unittest.skipUnless(shutil.which('openssl'), 'needs openssl to make a self-signed certificate')
+    def test_failed_certificate_reload_keeps_current_certificate(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            certfile, keyfile = make_certificate(tempdir)
+            server = start_server(self, certfile=certfile, keyfile=keyfile)
+
+            server.certfile = os.path.join(tempdir, 'broken.pem')
+            with open(server.certfile, 'w') as f:
+                f.write('-----BEGIN CERTIFICATE-----\nnot a certificate\n-----END CERTIFICATE-----\n')
+            with self.assertLogs('bespokehttp.server', 'ERROR'):
+                server.reload_certificate()
+
+            address = server.socket.getsockname()
+            self.assertEqual(get_peer_certificate(address, certfile), read_certificate(certfile))
+
+    @unittest.skipUnless(shutil.which('openssl'), 'needs openssl to make a self-signed certificate')
+    def test_slow_tls_reader_does_not_block_others(self):
+        import ssl
+
+        with tempfile.TemporaryDirectory(dir='./') as tempdir:
+            certfile, keyfile = make_certificate(tempdir)
+            with open(os.path.join(tempdir, 'large.bin'), 'wb') as f:
+                f.write(b'x' * 32 * 1024 * 1024)
+
+            address = start_server(self, certfile=certfile, keyfile=keyfile).socket.getsockname()
+            context = ssl.create_default_context(cafile=certfile)
+
+            with socket.create_connection(address, timeout=10) as raw_slow:
+                with context.wrap_socket(raw_slow, server_hostname='localhost') as slow:
+                    # ask for the large file, but don't read it, so the server can't finish
+                    # sending it
+                    slow.sendall('GET {}/large.bin HTTP/1.0\r\n\r\n'.format(tempdir[1:]).encode())
+                    slow.recv(1)
+
+                    with socket.create_connection(address, timeout=10) as raw_sock:
+                        with context.wrap_socket(raw_sock, server_hostname='localhost') as sock:
+                            sock.sendall(b'GET nonexistent HTTP/1.0\r\n\r\n')
+                            response = sock.recv(1024)
+
+        self.assertTrue(response.startswith(b'HTTP/1.0 404 Not Found'))
+
+
+if __name__ == '__main__':
+    unittest.main()